@@ -2,19 +2,28 @@ import os
 import sys
 import json
 import logging
+import logging.handlers
+import queue
+import atexit
 import base64
+import random
+import threading
+from collections import OrderedDict
 from typing import Any, Sequence
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
 from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
 
 import asyncio
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
-from google.auth.exceptions import RefreshError
+from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
+from google.auth.exceptions import RefreshError, TransportError
 
 from mcp.server import Server
 from mcp.types import (
@@ -27,19 +36,28 @@ from mcp.types import (
 )
 from mcp.server.stdio import stdio_server
 
-# Configure logging
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Configure logging, records are queued and written to stderr by a
+# background thread so log calls never block the event loop
+log_queue = queue.SimpleQueue()
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler(sys.stderr)],
+    handlers=[logging.handlers.QueueHandler(log_queue)],
+)
+# QueueHandler formats records before queueing them, so the stderr handler
+# writes the message as is
+log_listener = logging.handlers.QueueListener(
+    log_queue, logging.StreamHandler(sys.stderr)
 )
+log_listener.start()
+atexit.register(log_listener.stop)
 logger = logging.getLogger("gmail-mcp-server")
 
-# Log startup information
-logger.info("Gmail MCP Server starting...")
-logger.info(f"Python executable: {sys.executable}")
-logger.info(f"Current directory: {os.getcwd()}")
-
 # Load environment variables from .env file
 load_dotenv()
 
@@ -49,22 +67,62 @@ SCOPES = [
     "https://www.googleapis.com/auth/gmail.send",
 ]
 
-# Get credential paths from environment
-CREDENTIALS_FILE = os.getenv("GOOGLE_CREDENTIALS_FILE")
-TOKEN_FILE = os.getenv("GOOGLE_TOKEN_FILE")
+# Get credential paths from environment, the GOOGLE_* names are still accepted
+CONFIG_DIR = Path.home() / ".config" / "gmail-mcp"
+CREDENTIALS_FILE = (
+    os.getenv("GMAIL_CREDENTIALS_FILE")
+    or os.getenv("GOOGLE_CREDENTIALS_FILE")
+    or str(CONFIG_DIR / "credentials.json")
+)
+TOKEN_FILE = (
+    os.getenv("GMAIL_TOKEN_FILE")
+    or os.getenv("GOOGLE_TOKEN_FILE")
+    or str(CONFIG_DIR / "token.json")
+)
+
+# Gmail accepts at most 100 calls in a single batch request
+BATCH_SIZE = 100
+
+# Headers requested when fetching message summaries
+METADATA_HEADERS = ["Subject", "From", "Date"]
+
+# Headers returned by read_email
+EMAIL_HEADERS = ["Subject", "From", "To", "Date"]
+
+# Partial response covering only what summarize_message reads
+SUMMARY_FIELDS = "id,snippet,payload/headers"
+
+# Partial response for messages.list, only the ids are used
+LIST_FIELDS = "messages/id"
+
+# Set GMAIL_BATCH_REQUESTS=false to fetch messages with concurrent requests instead
+USE_BATCH_REQUESTS = os.getenv("GMAIL_BATCH_REQUESTS", "true").lower() != "false"
 
-if not CREDENTIALS_FILE:
-    raise ValueError("GMAIL_CREDENTIALS_FILE environment variable must be set")
-if not TOKEN_FILE:
-    raise ValueError("GMAIL_TOKEN_FILE environment variable must be set")
+# Upper bound on in-flight requests, keeps us under Gmail's per-user rate limit
+MAX_CONCURRENT_REQUESTS = 10
 
-logger.info(f"Using credentials file: {CREDENTIALS_FILE}")
-logger.info(f"Using token file: {TOKEN_FILE}")
+# How long before expiry the background task refreshes the access token
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+# Retry policy for rate-limited or failed Gmail requests
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+MAX_ATTEMPTS = 5
+MAX_BACKOFF = 16
+
+# Number of messages returned by the gmail://inbox/recent resource
+RECENT_MESSAGE_COUNT = 10
+
+# messages.list leaves these out by default, so history sync must too
+HIDDEN_LABELS = {"SPAM", "TRASH"}
+
+# Message summaries never change, so keep the most recently used ones around
+SUMMARY_CACHE_SIZE = 2000
 
 
 def create_message(to, subject, body, cc=None, bcc=None):
     """Create a message for an email."""
-    message = MIMEMultipart()
+    # Plain text only, so a single part is enough
+    message = MIMEText(body)
     message["to"] = to
     message["subject"] = subject
 
@@ -73,11 +131,143 @@ def create_message(to, subject, body, cc=None, bcc=None):
     if bcc:
         message["bcc"] = bcc
 
-    msg = MIMEText(body)
-    message.attach(msg)
-
+    # The request body is serialized as JSON, so raw has to be a str; base64
+    # output is pure ASCII
     raw = base64.urlsafe_b64encode(message.as_bytes())
-    return {"raw": raw.decode()}
+    return {"raw": raw.decode("ascii")}
+
+
+# Resource and tool listings are static, so build them once
+RESOURCES = [
+    Resource(
+        uri="gmail://inbox/recent",
+        name="Recent Gmail Messages",
+        mimeType="application/json",
+        description="Recent emails from your Gmail inbox",
+    )
+]
+
+TOOLS = [
+    Tool(
+        name="search_emails",
+        description="Search Gmail emails with a query",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Gmail search query",
+                },
+                "max_results": {
+                    "type": "number",
+                    "description": "Maximum number of results",
+                    "default": 10,
+                },
+            },
+            "required": ["query"],
+        },
+    ),
+    Tool(
+        name="read_email",
+        description="Read the content of a specific email",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "message_id": {
+                    "type": "string",
+                    "description": "ID of the email message to read",
+                },
+            },
+            "required": ["message_id"],
+        },
+    ),
+    Tool(
+        name="send_email",
+        description="Send an email to specified recipients",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "to": {
+                    "type": "string",
+                    "description": "Recipient email address",
+                },
+                "subject": {
+                    "type": "string",
+                    "description": "Email subject",
+                },
+                "body": {
+                    "type": "string",
+                    "description": "Email body content",
+                },
+                "cc": {
+                    "type": "string",
+                    "description": "CC recipients (comma-separated)",
+                },
+                "bcc": {
+                    "type": "string",
+                    "description": "BCC recipients (comma-separated)",
+                },
+            },
+            "required": ["to", "subject", "body"],
+        },
+    ),
+]
+
+
+def to_json(data):
+    """Serialize response data to a compact JSON string."""
+    if orjson is not None:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data, separators=(",", ":"))
+
+
+def from_json(text):
+    """Parse a JSON document, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def extract_headers(payload_headers, wanted=METADATA_HEADERS):
+    """Pick the wanted headers out of a message, stopping once all are found."""
+    found = {}
+    for header in payload_headers:
+        name = header["name"]
+        if name in wanted and name not in found:
+            found[name] = header["value"]
+            if len(found) == len(wanted):
+                break
+    return found
+
+
+def summarize_message(message):
+    """Build a summary dict from a metadata-format message."""
+    headers = extract_headers(message["payload"]["headers"])
+
+    return {
+        "id": message["id"],
+        "subject": headers.get("Subject", "No Subject"),
+        "from": headers.get("From", "Unknown"),
+        "date": headers.get("Date", "Unknown"),
+        "snippet": message.get("snippet", ""),
+    }
+
+
+def requires_relist(record):
+    """Check whether a history record can remove messages from the recent list."""
+    if "messagesDeleted" in record:
+        return True
+    # Ordinary label changes such as UNREAD don't affect messages.list results
+    for key in ("labelsAdded", "labelsRemoved"):
+        for item in record.get(key, []):
+            if HIDDEN_LABELS.intersection(item.get("labelIds", [])):
+                return True
+    return False
+
+
+def log_server_error(error):
+    """Log errors reported by the MCP server."""
+    logger.error("Server error: %s", error)
 
 
 class GmailServer:
@@ -86,184 +276,314 @@ class GmailServer:
         self.server = Server("gmail-mcp-server")
         self.credentials = None
         self.gmail_service = None
+        self._messages = None
+        self._service_credentials = None
+        self._token_data = None
+        self._token_mtime = 0
+        self._auth_lock = asyncio.Lock()
+        self._thread_local = threading.local()
+        self._refresh_task = None
+        self._warm_up_task = None
+        self._summary_cache = OrderedDict()
+        self._recent_ids = []
+        self._recent_history_id = None
 
         self.setup_handlers()
         self.setup_error_handling()
         logger.info("GmailServer initialization complete")
 
     def setup_error_handling(self):
-        def error_handler(error):
-            logger.error(f"Server error: {error}")
-
-        self.server.onerror = error_handler
+        self.server.onerror = log_server_error
 
     def load_saved_credentials(self):
         """Load credentials from the token file if it exists."""
-        if os.path.exists(TOKEN_FILE):
-            try:
+        try:
+            mtime = os.stat(TOKEN_FILE).st_mtime
+        except FileNotFoundError:
+            return None
+
+        try:
+            # Only re-read the token file when it has changed on disk
+            if self._token_data is None or mtime != self._token_mtime:
                 with open(TOKEN_FILE, "r") as token:
-                    token_data = json.load(token)
-                    return Credentials.from_authorized_user_info(token_data, SCOPES)
-            except Exception as e:
-                logger.error(f"Error loading saved credentials: {e}")
-                return None
-        return None
+                    self._token_data = from_json(token.read())
+                self._token_mtime = mtime
+            return Credentials.from_authorized_user_info(self._token_data, SCOPES)
+        except Exception as e:
+            logger.error("Error loading saved credentials: %s", e)
+            return None
 
     def save_credentials(self, credentials):
         """Save credentials to the token file."""
         try:
-            os.makedirs(os.path.dirname(TOKEN_FILE), exist_ok=True)
+            token_dir = os.path.dirname(TOKEN_FILE)
+            if token_dir:
+                os.makedirs(token_dir, exist_ok=True)
             with open(TOKEN_FILE, "w") as token:
                 token.write(credentials.to_json())
             logger.info("Credentials saved successfully")
         except Exception as e:
-            logger.error(f"Error saving credentials: {e}")
+            logger.error("Error saving credentials: %s", e)
 
     async def refresh_credentials(self):
         """Attempt to refresh the credentials."""
         logger.info("Attempting to refresh credentials")
         try:
             if self.credentials and self.credentials.refresh_token:
-                self.credentials.refresh(Request())
+                await asyncio.to_thread(self.credentials.refresh, Request())
                 self.save_credentials(self.credentials)
                 return True
             return False
         except RefreshError as e:
-            logger.error(f"Failed to refresh credentials: {e}")
+            logger.error("Failed to refresh credentials: %s", e)
             return False
 
+    async def refresh_loop(self):
+        """Refresh the access token shortly before it expires."""
+        failures = 0
+        while self.credentials and self.credentials.expiry:
+            # google-auth stores expiry as a naive UTC datetime
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            delay = self.credentials.expiry - TOKEN_REFRESH_MARGIN - now
+            await asyncio.sleep(max(delay.total_seconds(), 0))
+
+            try:
+                async with self._auth_lock:
+                    refreshed = await self.refresh_credentials()
+            except TransportError as e:
+                # Network trouble is usually brief, so back off and try again
+                failures += 1
+                retry = min(2**failures + random.random(), MAX_BACKOFF)
+                logger.warning(
+                    "Background refresh hit a network error, retrying in %.1fs: %s",
+                    retry,
+                    e,
+                )
+                await asyncio.sleep(retry)
+                continue
+
+            if not refreshed:
+                logger.info("Background refresh failed, stopping refresh loop")
+                return
+            failures = 0
+
+    def cache_summary(self, summary):
+        """Store a message summary, evicting the least recently used entry."""
+        cache = self._summary_cache
+        message_id = summary["id"]
+        cache[message_id] = summary
+        cache.move_to_end(message_id)
+        if len(cache) > SUMMARY_CACHE_SIZE:
+            cache.popitem(last=False)
+
+    def thread_http(self):
+        """Return the calling thread's authorized Http, creating it if needed."""
+        # httplib2 is not thread-safe, so each worker thread keeps its own Http
+        # and reuses its keep-alive connections across requests
+        http = getattr(self._thread_local, "http", None)
+        if http is None or http.credentials is not self.credentials:
+            # build_http applies the client library's default socket timeout
+            http = AuthorizedHttp(self.credentials, http=build_http())
+            self._thread_local.http = http
+        return http
+
+    async def execute_request(self, request, attempts=MAX_ATTEMPTS):
+        """Execute a Gmail API request in a worker thread, retrying transient errors."""
+
+        def execute():
+            return request.execute(http=self.thread_http())
+
+        for attempt in range(attempts):
+            try:
+                return await asyncio.to_thread(execute)
+            except HttpError as e:
+                if e.resp.status not in RETRYABLE_STATUSES or attempt + 1 == attempts:
+                    raise
+                delay = min(2**attempt * 0.5 + random.random(), MAX_BACKOFF)
+                logger.info(
+                    "Gmail returned %s, retrying in %.1fs", e.resp.status, delay
+                )
+                await asyncio.sleep(delay)
+
+    def summary_request(self, message_id):
+        """Build a metadata-only request for a message summary."""
+        return self._messages.get(
+            userId="me",
+            id=message_id,
+            format="metadata",
+            metadataHeaders=METADATA_HEADERS,
+            fields=SUMMARY_FIELDS,
+        )
+
+    async def get_messages_in_batches(self, ids):
+        """Fetch message metadata with Gmail batch requests."""
+        messages = []
+        failed = []
+
+        def collect(request_id, response, exception):
+            if exception is not None:
+                failed.append(request_id)
+            else:
+                messages.append(response)
+
+        summary_request = self.summary_request
+        for start in range(0, len(ids), BATCH_SIZE):
+            batch = self.gmail_service.new_batch_http_request(callback=collect)
+            add = batch.add
+            for message_id in ids[start : start + BATCH_SIZE]:
+                add(summary_request(message_id), request_id=message_id)
+            await self.execute_request(batch)
+
+        # Refetch failed calls individually so successful ones aren't repeated
+        if failed:
+            logger.info("Retrying %d failed batch calls individually", len(failed))
+            messages.extend(await self.get_messages_concurrently(failed))
+
+        return messages
+
+    async def get_messages_concurrently(self, ids):
+        """Fetch message metadata with concurrent individual requests."""
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+        async def fetch_limited(message_id):
+            async with semaphore:
+                return await self.execute_request(self.summary_request(message_id))
+
+        # Let every fetch finish before surfacing the first error
+        results = await asyncio.gather(
+            *(fetch_limited(i) for i in ids), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
+
+    async def list_message_ids(self, **params):
+        """List message ids matching the given messages.list parameters."""
+        response = await self.execute_request(
+            self._messages.list(userId="me", fields=LIST_FIELDS, **params)
+        )
+        return [msg["id"] for msg in response.get("messages", [])]
+
+    async def get_recent_message_ids(self):
+        """Return the most recent message ids, syncing from history when possible."""
+        history_id = None
+        if self._recent_history_id is not None:
+            ids, history_id = await self.sync_recent_message_ids()
+            if ids is not None:
+                return ids
+
+        # Take the history id before listing so nothing added meanwhile is missed
+        if history_id is None:
+            profile = await self.execute_request(
+                self.gmail_service.users().getProfile(userId="me")
+            )
+            history_id = profile["historyId"]
+        self._recent_ids = await self.list_message_ids(maxResults=RECENT_MESSAGE_COUNT)
+        self._recent_history_id = history_id
+        return self._recent_ids
+
+    async def sync_recent_message_ids(self):
+        """Apply added messages from history, returning (ids, history id).
+
+        ids is None when the changes require a full re-list.
+        """
+        added = []
+        page_token = None
+        while True:
+            try:
+                response = await self.execute_request(
+                    self.gmail_service.users()
+                    .history()
+                    .list(
+                        userId="me",
+                        startHistoryId=self._recent_history_id,
+                        pageToken=page_token,
+                    )
+                )
+            except HttpError as e:
+                # Gmail only keeps history for a limited time
+                if e.resp.status == 404:
+                    return None, None
+                raise
+
+            for record in response.get("history", []):
+                if requires_relist(record):
+                    return None, response["historyId"]
+                for item in record.get("messagesAdded", []):
+                    message = item["message"]
+                    if not HIDDEN_LABELS.intersection(message.get("labelIds", [])):
+                        added.append(message["id"])
+
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                break
+
+        # History is oldest first, the recent list is newest first
+        ids = dict.fromkeys(reversed(added))
+        ids.update(dict.fromkeys(self._recent_ids))
+        self._recent_ids = list(ids)[:RECENT_MESSAGE_COUNT]
+        self._recent_history_id = response["historyId"]
+        return self._recent_ids, self._recent_history_id
+
+    async def get_message_summaries(self, ids):
+        """Return summaries for the given message ids, fetching uncached ones."""
+        # Hold the hits locally and mark them recently used before inserting
+        # misses, so neither this call nor a concurrent one can evict them
+        cache = self._summary_cache
+        summaries = {}
+        for message_id in ids:
+            if message_id in cache:
+                cache.move_to_end(message_id)
+                summaries[message_id] = cache[message_id]
+
+        missing = [i for i in ids if i not in summaries]
+        if missing:
+            if USE_BATCH_REQUESTS:
+                messages = await self.get_messages_in_batches(missing)
+            else:
+                messages = await self.get_messages_concurrently(missing)
+            cache_summary = self.cache_summary
+            for message in messages:
+                summary = summarize_message(message)
+                summaries[summary["id"]] = summary
+                cache_summary(summary)
+
+        return [summaries[i] for i in ids]
+
     def setup_handlers(self):
         @self.server.list_resources()
         async def list_resources() -> list[Resource]:
             """List available Gmail resources."""
-            logger.info("Listing Gmail resources")
-            return [
-                Resource(
-                    uri="gmail://inbox/recent",
-                    name="Recent Gmail Messages",
-                    mimeType="application/json",
-                    description="Recent emails from your Gmail inbox",
-                )
-            ]
+            logger.debug("Listing Gmail resources")
+            return RESOURCES
 
         @self.server.read_resource()
         async def read_resource(uri: str) -> str:
             """Read Gmail resources."""
-            logger.info(f"Reading resource: {uri}")
+            logger.debug("Reading resource: %s", uri)
             await self.ensure_authenticated()
 
             if uri == "gmail://inbox/recent":
-                messages = (
-                    self.gmail_service.users()
-                    .messages()
-                    .list(userId="me", maxResults=10)
-                    .execute()
-                )
-
-                detailed_messages = []
-                for msg in messages.get("messages", []):
-                    message = (
-                        self.gmail_service.users()
-                        .messages()
-                        .get(userId="me", id=msg["id"])
-                        .execute()
-                    )
-
-                    headers = {
-                        header["name"]: header["value"]
-                        for header in message["payload"]["headers"]
-                    }
-
-                    detailed_messages.append(
-                        {
-                            "id": message["id"],
-                            "subject": headers.get("Subject", "No Subject"),
-                            "from": headers.get("From", "Unknown"),
-                            "date": headers.get("Date", "Unknown"),
-                            "snippet": message.get("snippet", ""),
-                        }
-                    )
+                ids = await self.get_recent_message_ids()
+                detailed_messages = await self.get_message_summaries(ids)
 
-                return json.dumps(detailed_messages, indent=2)
+                return to_json(detailed_messages)
 
             raise ValueError(f"Unknown resource: {uri}")
 
         @self.server.list_tools()
         async def list_tools() -> list[Tool]:
             """List available Gmail tools."""
-            logger.info("Listing Gmail tools")
-            return [
-                Tool(
-                    name="search_emails",
-                    description="Search Gmail emails with a query",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "query": {
-                                "type": "string",
-                                "description": "Gmail search query",
-                            },
-                            "max_results": {
-                                "type": "number",
-                                "description": "Maximum number of results",
-                                "default": 10,
-                            },
-                        },
-                        "required": ["query"],
-                    },
-                ),
-                Tool(
-                    name="read_email",
-                    description="Read the content of a specific email",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "message_id": {
-                                "type": "string",
-                                "description": "ID of the email message to read",
-                            },
-                        },
-                        "required": ["message_id"],
-                    },
-                ),
-                Tool(
-                    name="send_email",
-                    description="Send an email to specified recipients",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "to": {
-                                "type": "string",
-                                "description": "Recipient email address",
-                            },
-                            "subject": {
-                                "type": "string",
-                                "description": "Email subject",
-                            },
-                            "body": {
-                                "type": "string",
-                                "description": "Email body content",
-                            },
-                            "cc": {
-                                "type": "string",
-                                "description": "CC recipients (comma-separated)",
-                            },
-                            "bcc": {
-                                "type": "string",
-                                "description": "BCC recipients (comma-separated)",
-                            },
-                        },
-                        "required": ["to", "subject", "body"],
-                    },
-                ),
-            ]
+            logger.debug("Listing Gmail tools")
+            return TOOLS
 
         @self.server.call_tool()
         async def call_tool(
             name: str, arguments: Any
         ) -> Sequence[TextContent | ImageContent | EmbeddedResource]:
             """Handle tool calls for Gmail operations."""
-            logger.info(f"Calling tool: {name} with arguments: {arguments}")
+            logger.debug("Calling tool: %s with arguments: %s", name, arguments)
             await self.ensure_authenticated()
 
             try:
@@ -271,17 +591,15 @@ class GmailServer:
                     if not isinstance(arguments, dict) or "message_id" not in arguments:
                         raise ValueError("Message ID is required")
 
-                    message = (
-                        self.gmail_service.users()
-                        .messages()
-                        .get(userId="me", id=arguments["message_id"], format="full")
-                        .execute()
+                    message = await self.execute_request(
+                        self._messages.get(
+                            userId="me", id=arguments["message_id"], format="full"
+                        )
                     )
 
-                    headers = {
-                        header["name"]: header["value"]
-                        for header in message["payload"]["headers"]
-                    }
+                    headers = extract_headers(
+                        message["payload"]["headers"], EMAIL_HEADERS
+                    )
 
                     # Extract email body
                     body = ""
@@ -309,55 +627,28 @@ class GmailServer:
                         "body": body,
                     }
 
-                    return [
-                        TextContent(
-                            type="text", text=json.dumps(email_content, indent=2)
-                        )
-                    ]
+                    return [TextContent(type="text", text=to_json(email_content))]
 
                 elif name == "search_emails":
                     if not isinstance(arguments, dict) or "query" not in arguments:
                         raise ValueError("Invalid search arguments")
 
-                    messages = (
-                        self.gmail_service.users()
-                        .messages()
-                        .list(
-                            userId="me",
-                            q=arguments["query"],
-                            maxResults=arguments.get("max_results", 10),
-                        )
-                        .execute()
+                    ids = await self.list_message_ids(
+                        q=arguments["query"],
+                        maxResults=arguments.get("max_results", 10),
                     )
+                    detailed_messages = await self.get_message_summaries(ids)
 
-                    detailed_messages = []
-                    for msg in messages.get("messages", []):
-                        message = (
-                            self.gmail_service.users()
-                            .messages()
-                            .get(userId="me", id=msg["id"])
-                            .execute()
-                        )
-
-                        headers = {
-                            header["name"]: header["value"]
-                            for header in message["payload"]["headers"]
-                        }
-
-                        detailed_messages.append(
-                            {
-                                "id": message["id"],
-                                "subject": headers.get("Subject", "No Subject"),
-                                "from": headers.get("From", "Unknown"),
-                                "date": headers.get("Date", "Unknown"),
-                                "snippet": message.get("snippet", ""),
-                            }
-                        )
+                    # Keep an explicit empty result so callers can tell there
+                    # were no matches
+                    if not detailed_messages:
+                        return [TextContent(type="text", text="[]")]
 
+                    # One content block per message, so no single string holds
+                    # the whole result
                     return [
-                        TextContent(
-                            type="text", text=json.dumps(detailed_messages, indent=2)
-                        )
+                        TextContent(type="text", text=to_json(message))
+                        for message in detailed_messages
                     ]
 
                 elif name == "send_email":
@@ -366,9 +657,6 @@ class GmailServer:
                     ):
                         raise ValueError("Invalid email arguments")
 
-                    # Always attempt to refresh before sending
-                    await self.refresh_credentials()
-
                     message = create_message(
                         to=arguments["to"],
                         subject=arguments["subject"],
@@ -377,11 +665,10 @@ class GmailServer:
                         bcc=arguments.get("bcc"),
                     )
 
-                    sent_message = (
-                        self.gmail_service.users()
-                        .messages()
-                        .send(userId="me", body=message)
-                        .execute()
+                    # Sending is not idempotent, so never retry it
+                    sent_message = await self.execute_request(
+                        self._messages.send(userId="me", body=message),
+                        attempts=1,
                     )
 
                     return [
@@ -395,48 +682,88 @@ class GmailServer:
                     raise ValueError(f"Unknown tool: {name}")
 
             except Exception as e:
-                logger.error(f"Gmail API error: {str(e)}")
+                logger.error("Gmail API error: %s", e)
                 return [TextContent(type="text", text=f"Error: {str(e)}")]
 
     async def ensure_authenticated(self):
         """Ensure we have valid Gmail API credentials."""
-        logger.info("Checking Gmail authentication")
-
-        if not self.credentials:
-            self.credentials = self.load_saved_credentials()
-
-        if not self.credentials:
-            logger.info("No saved credentials found, starting OAuth flow")
-            if not os.path.exists(CREDENTIALS_FILE):
-                raise ValueError(f"Credentials file not found at {CREDENTIALS_FILE}")
-
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SCOPES)
-            self.credentials = flow.run_local_server(port=0)
-            self.save_credentials(self.credentials)
-        elif not self.credentials.valid:
-            if self.credentials.expired and self.credentials.refresh_token:
+        if (
+            self.gmail_service is not None
+            and self.credentials is not None
+            and self.credentials.valid
+        ):
+            return
+
+        logger.debug("Checking Gmail authentication")
+
+        # Serialize concurrent callers so only one of them runs the OAuth flow
+        # or builds the service
+        async with self._auth_lock:
+            if not self.credentials:
+                self.credentials = self.load_saved_credentials()
+
+            if (
+                self.credentials
+                and not self.credentials.valid
+                and self.credentials.expired
+                and self.credentials.refresh_token
+            ):
                 logger.info("Credentials expired, attempting refresh")
-                success = await self.refresh_credentials()
-                if not success:
-                    logger.info("Refresh failed, starting new OAuth flow")
-                    flow = InstalledAppFlow.from_client_secrets_file(
-                        CREDENTIALS_FILE, SCOPES
+                if not await self.refresh_credentials():
+                    logger.info("Refresh failed")
+                    self.credentials = None
+
+            if not self.credentials or not self.credentials.valid:
+                logger.info("No usable credentials, starting OAuth flow")
+                if not os.path.exists(CREDENTIALS_FILE):
+                    raise ValueError(
+                        f"Credentials file not found at {CREDENTIALS_FILE}"
                     )
-                    self.credentials = flow.run_local_server(port=0)
-                    self.save_credentials(self.credentials)
-            else:
-                logger.info("Invalid credentials, starting new OAuth flow")
+
                 flow = InstalledAppFlow.from_client_secrets_file(
                     CREDENTIALS_FILE, SCOPES
                 )
-                self.credentials = flow.run_local_server(port=0)
+                self.credentials = await asyncio.to_thread(
+                    flow.run_local_server, port=0
+                )
                 self.save_credentials(self.credentials)
 
-        self.gmail_service = build("gmail", "v1", credentials=self.credentials)
+            # Building the service parses the discovery document, so only do it
+            # when the credentials object changes
+            if (
+                self.gmail_service is None
+                or self._service_credentials is not self.credentials
+            ):
+                self.gmail_service = await asyncio.to_thread(
+                    build,
+                    "gmail",
+                    "v1",
+                    credentials=self.credentials,
+                    cache_discovery=False,
+                    static_discovery=True,
+                )
+                self._service_credentials = self.credentials
+                self._messages = self.gmail_service.users().messages()
+
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = asyncio.create_task(self.refresh_loop())
+
         logger.info("Gmail authentication complete")
 
+    async def warm_up(self):
+        """Authenticate and build the service ahead of the first request."""
+        try:
+            await self.ensure_authenticated()
+        except Exception as e:
+            logger.error("Warm-up authentication failed: %s", e)
+
     async def run(self):
         """Run the MCP server."""
+        # With a saved token, authenticate while the client is still connecting;
+        # otherwise wait for the first request before opening the browser flow
+        if os.path.exists(TOKEN_FILE):
+            self._warm_up_task = asyncio.create_task(self.warm_up())
+
         logger.info("Starting server with stdio transport")
         async with stdio_server() as (read_stream, write_stream):
             await self.server.run(
@@ -447,11 +774,15 @@ class GmailServer:
 def main():
     """Main entry point for the Gmail MCP server."""
     try:
-        logger.info("Starting main")
+        logger.info("Gmail MCP Server starting...")
+        logger.info("Python executable: %s", sys.executable)
+        logger.info("Current directory: %s", os.getcwd())
+        logger.info("Using credentials file: %s", CREDENTIALS_FILE)
+        logger.info("Using token file: %s", TOKEN_FILE)
         server = GmailServer()
         asyncio.run(server.run())
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+        logger.error("Unexpected error: %s", e, exc_info=True)
         raise
 
 
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The package isn't installed for tests, so import it from src/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
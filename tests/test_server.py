@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("mcp")
+pytest.importorskip("googleapiclient")
+
+from gmail_mcp_server import server  # noqa: E402
+
+
+def metadata_message(message_id):
+    return {
+        "id": message_id,
+        "snippet": f"snippet {message_id}",
+        "payload": {
+            "headers": [
+                {"name": "Subject", "value": f"subject {message_id}"},
+                {"name": "From", "value": "sender@example.com"},
+                {"name": "Date", "value": "Mon, 1 Jan 2024 00:00:00 +0000"},
+            ]
+        },
+    }
+
+
+def test_summary_cache_eviction_keeps_hits(monkeypatch):
+    monkeypatch.setattr(server, "SUMMARY_CACHE_SIZE", 4)
+    monkeypatch.setattr(server, "USE_BATCH_REQUESTS", True)
+
+    gmail = server.GmailServer()
+    fetched = []
+
+    async def get_messages_in_batches(ids):
+        fetched.append(list(ids))
+        return [metadata_message(i) for i in ids]
+
+    monkeypatch.setattr(gmail, "get_messages_in_batches", get_messages_in_batches)
+
+    asyncio.run(gmail.get_message_summaries(["a", "b", "c", "d"]))
+    # a and b are the least recently used hits, inserting x and y must not
+    # evict them before they are returned
+    summaries = asyncio.run(gmail.get_message_summaries(["a", "b", "x", "y"]))
+
+    assert [s["id"] for s in summaries] == ["a", "b", "x", "y"]
+    assert fetched == [["a", "b", "c", "d"], ["x", "y"]]
+    assert list(gmail._summary_cache) == ["a", "b", "x", "y"]
+
+
+def test_requires_relist_ignores_read_state_changes():
+    read = {"id": "1", "labelsRemoved": [{"message": {}, "labelIds": ["UNREAD"]}]}
+    trashed = {"id": "2", "labelsAdded": [{"message": {}, "labelIds": ["TRASH"]}]}
+    deleted = {"id": "3", "messagesDeleted": [{"message": {}}]}
+
+    assert not server.requires_relist(read)
+    assert server.requires_relist(trashed)
+    assert server.requires_relist(deleted)